@@ -1,6 +1,5 @@
 import json
 import time
-import csv
 import os
 import os.path
 import itertools
@@ -13,12 +12,14 @@ class Backend(object):
     def __init__(self):
         self.instrument_drivers = {}
         self.instruments = {}
+        self._inst_items = ()
         self.config = None
         self.data_logger = None
         self.logging = False
         self.config_dir = None
 
     def set_config(self, value, directory):
+        self.close_instruments()
         self.config = value
         self.config_dir = directory
 
@@ -34,9 +35,22 @@ class Backend(object):
     def start(self):
         self.data_logger = DataLogger(self.config.flush_datafiles)
 
+        # Reuse instruments from the previous run so their connections stay open
+        instruments = {}
         for name, instcfg in self.config.instruments.items():
-            driver_cls = self.instrument_drivers[type(instcfg)]
-            self.instruments[name] = driver_cls(instcfg)
+            inst = self.instruments.pop(name, None)
+            if inst is not None and inst.config is instcfg:
+                inst.reset()
+            else:
+                if inst is not None:
+                    self._close_instrument(inst)
+                driver_cls = self.instrument_drivers[type(instcfg)]
+                inst = driver_cls(instcfg)
+            instruments[name] = inst
+        for inst in self.instruments.values():
+            self._close_instrument(inst)
+        self.instruments = instruments
+        self._inst_items = tuple(self.instruments.items())
 
         self.start_time = datetime.now(timezone.utc)
         for name, inst in self.instruments.items():
@@ -45,11 +59,23 @@ class Backend(object):
     def stop(self):
         for inst in self.instruments.values():
             inst.stop()
-        self.instruments = {}
+        self._inst_items = ()
         if self.logging:
             self.stop_logging()
         self.data_logger = None
 
+    def close_instruments(self):
+        """Stop and disconnect all instruments kept from previous runs"""
+        self.stop()
+        for inst in self.instruments.values():
+            self._close_instrument(inst)
+        self.instruments = {}
+
+    def _close_instrument(self, inst):
+        if inst.opened:
+            inst.close()
+            inst.opened = False
+
     def start_logging(self, sample_name):
         datadir = os.path.normpath(os.path.join(self.config_dir, self.config.datadir))
         exists = self.data_logger.open_files(self.instruments.keys(), datadir, sample_name)
@@ -74,18 +100,26 @@ class Backend(object):
             inst.on_record_stop()
 
     def process_samples(self, fns):
-        for name, inst in self.instruments.items():
+        logging = self.logging
+        start_time = self.start_time
+        master = self.config.master_instrument
+        if logging:
+            log_time = self.log_time
+            write = self.data_logger.write
+        for name, inst in self._inst_items:
             samples = inst.get_samples()
-            if self.logging:
+            if logging:
+                is_master = name == master
                 for s in samples:
-                    if self.remaining_samples != 0 or name != self.config.master_instrument:
-                        if name == self.config.master_instrument:
+                    if self.remaining_samples != 0 or not is_master:
+                        if is_master:
                             self.remaining_samples -= 1
-                        self.data_logger.write(name, itertools.chain([s[0].timestamp(), (s[0]-self.log_time).total_seconds()], inst.format_sample(s[1])))
-                    
-            if name in fns:
+                        write(name, itertools.chain([s[0].timestamp(), (s[0]-log_time).total_seconds()], inst.format_sample(s[1])))
+
+            fn = fns.get(name)
+            if fn is not None:
                 for s in samples:
-                    fns[name]((s[0]-self.start_time).total_seconds(), s[0], s[1])
+                    fn((s[0]-start_time).total_seconds(), s[0], s[1])
 
         if self.logging and self.remaining_samples == 0:
             self.stop_logging()
@@ -98,41 +132,67 @@ class Backend(object):
         return True
 
 
+def format_field(value):
+    """Format a value the same way as csv.writer with minimal quoting"""
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        if ',' in value or '"' in value or '\n' in value or '\r' in value:
+            return '"' + value.replace('"', '""') + '"'
+        return value
+    if value != value: # nan marks a missing value
+        return ''
+    return str(value)
+
+
 class DataLogger(object):
     def __init__(self, doflush):
         self.files = {}
-        self.writers = {}
+        self.pending = {}
         self.last_write = {}
         self.doflush = doflush
         self.flushinterval = 10.0 # Seconds
+        self.batchsize = 256 # Rows buffered before writing out
 
     def open_files(self, names, datadir, sample_name):
         exists = []
-        if not os.path.exists(datadir):
-            os.makedirs(datadir)
+        os.makedirs(datadir, exist_ok=True)
+        # normcase so matching is case insensitive where the filesystem is
+        with os.scandir(datadir) as entries:
+            existing_names = {os.path.normcase(e.name) for e in entries if e.is_file()}
         for name in names:
-            fname = os.path.join(datadir, sample_name)
-            fname += '_' + name + ".csv"
-            if os.path.isfile(fname):
-                exists.append(True)
-            else:
-                exists.append(False)
-            fp = open(fname, 'a', newline='')
+            basename = sample_name + '_' + name + ".csv"
+            fname = os.path.join(datadir, basename)
+            exists.append(os.path.normcase(basename) in existing_names)
+            fp = open(fname, 'a', newline='', buffering=1<<16)
             self.files[name] = fp
-            self.writers[name] = csv.writer(fp)
+            self.pending[name] = []
             self.last_write[name] = time.time()
         return exists
 
     def close_files(self):
+        self.flush()
         for f in self.files.values():
             f.close()
         self.files = {}
-        self.writers = {}
+        self.pending = {}
+
+    def flush(self, name=None):
+        """Write out buffered rows for one file, or all files if name is None"""
+        names = self.pending.keys() if name is None else [name]
+        for n in names:
+            lines = self.pending[n]
+            if lines:
+                self.files[n].write(''.join(lines))
+                lines.clear()
+            self.files[n].flush()
 
     def write(self, name, data):
-        self.writers[name].writerow(data)
+        lines = self.pending[name]
+        lines.append(','.join(map(format_field, data)) + '\r\n')
+        if len(lines) >= self.batchsize:
+            self.flush(name)
         if self.doflush and (time.time() - self.last_write[name] > self.flushinterval):
             self.last_write[name] += self.flushinterval
-            fh = self.files[name]
-            fh.flush()
-            os.fsync(fh.fileno())
+            self.flush(name)
+            os.fsync(self.files[name].fileno())
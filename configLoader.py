@@ -2,6 +2,11 @@ import os
 from schema import TObject, TDict, TUnion, TList, TString, TFloat, TInt, TBool
 import json
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 class ConfigLoader():
     def __init__(self):
         class Configuration(TObject):
@@ -21,10 +26,10 @@ class ConfigLoader():
         union.dtypes[dtype.dtypes['type_'].default] = dtype
 
     def loadFile(self, fp):
-        return self.schema(json.load(fp))
+        return self.schema(json_loads(fp.read()))
 
     def loadString(self, value):
-        return self.schema(json.loads(value))
+        return self.schema(json_loads(value))
 
     def loadData(self, value):
         return self.schema(value)
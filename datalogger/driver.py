@@ -9,10 +9,14 @@ class Driver(Instrument):
         super().__init__()
         self.config = config
 
-    def setup(self):
+    def open(self):
         import serial
         self.res = serial.Serial(self.config.serialPort, timeout=3.0)
 
+    def setup(self):
+        # Discard anything sent while the port was idle between runs
+        self.res.reset_input_buffer()
+
     def sample(self):
         sampletime = datetime.now(timezone.utc)
 
@@ -51,7 +55,7 @@ class Driver(Instrument):
         data = self.read_bytes(2)
         return (data[1] | ((data[0] & 0x3f)<<8))*0.1
 
-    def cleanup(self):
+    def close(self):
         self.res.close()
 
     def get_headers(self):
@@ -1,3 +1,4 @@
+import collections
 import queue
 import threading
 import time
@@ -40,11 +41,23 @@ class Wrapper(object):
 
 class Instrument(object):
     def __init__(self):
-        self.queue = queue.Queue()
+        # Single producer (acquire thread), single consumer (UI timer)
+        self.queue = collections.deque()
         self.running = False
-        self.thread = threading.Thread(target=self._run)
+        self.opened = False
+        self.thread = None
         self.commandqueue = queue.Queue()
 
+    def open(self):
+        """
+        Override this to connect to the instrument
+
+        The connection is kept across start/stop cycles until close() is called.
+        """
+
+    def close(self):
+        """Override this to close the connection made in open()"""
+
     def setup(self):
         """Override this to setup the instrument"""
 
@@ -53,7 +66,7 @@ class Instrument(object):
         return None
 
     def cleanup(self):
-        """Override this to close the instrument cleanly"""
+        """Override this to leave the instrument cleanly after a run"""
 
     def get_headers(self):
         """Override this to return a list of logfile headers"""
@@ -63,7 +76,13 @@ class Instrument(object):
         """Override this for convert samples into a list for logging"""
         return []
 
+    def _open(self):
+        if not self.opened:
+            self.open()
+            self.opened = True
+
     def _run(self):
+        self._open()
         self.setup()
         while self.running:
             while True:
@@ -73,31 +92,40 @@ class Instrument(object):
                     break
             sample = self.sample()
             if sample is not None:
-                self.queue.put(sample)
+                self.queue.append(sample)
         self.cleanup()
 
     def start(self):
         """Start the acquire loop"""
         self.running = True
+        self.thread = threading.Thread(target=self._run)
         self.thread.start()
 
     def stop(self):
         """Stop the acquire loop"""
+        if self.thread is None:
+            return
         self.running = False
         self.thread.join()
+        self.thread = None
+
+    def reset(self):
+        """Re-arm a stopped instrument so it can be started again"""
+        self.queue.clear()
+        # Drop commands left over from the previous run
+        while True:
+            try:
+                self.commandqueue.get_nowait()
+            except queue.Empty:
+                break
 
     def runcmd(self, command):
         self.commandqueue.put(command)
 
     def get_samples(self):
         """Retrieve all collected samples from the sample queue"""
-        results = []
-        while True:
-            try:
-                results.append(self.queue.get_nowait())
-            except queue.Empty:
-                break
-        return results
+        popleft = self.queue.popleft
+        return [popleft() for _ in range(len(self.queue))]
 
     def on_record_start(self):
         """Called when datalogging has started"""
@@ -24,6 +24,10 @@ class Wrapper(object):
     def query_ascii_values(self, cmd, *args, **kwargs):
         return self.res.query_ascii_values(cmd.format(*args, **kwargs))
 
+    def query_binary_values(self, cmd, *args, datatype='f', is_big_endian=False, container=list, **kwargs):
+        return self.res.query_binary_values(cmd.format(*args, **kwargs), datatype=datatype,
+                                            is_big_endian=is_big_endian, container=container)
+
     def write_ascii_values(self, cmd, data, *args, **kwargs):
         self.res.write(cmd.format(*args, **kwargs) + " " + ",".join([repr(x) for x in data]))
         #self.res.write_ascii_values(cmd.format(*args, **kwargs), data)
@@ -11,6 +11,25 @@ from patch import useNativeDialog
 
 MainWindowUI, MainWindowBase = loadUiType(getResourcePath('ui/mainWindow.ui'))
 
+NEW_CONFIG = {
+    'instruments': {
+        'vna0': {
+            'type': 'vna',
+            'model': 'simulated',
+            'segments': {
+                'TM010' : {
+                    'type': 'Electric',
+                    'f0': 2500700000.0,
+                    'span': 1000000.0,
+                    'points': 201,
+                    'ifbw': 1000.0,
+                    'power': 0.0
+                }
+            }
+        }
+    }
+}
+
 class InstrumentInfo:
     def __init__(self, name, dataWindow, configWindow, icon, defaultConfig):
         self.name = name
@@ -53,6 +72,8 @@ class MainWindow(MainWindowBase, MainWindowUI):
         self.samplesList.currentRowChanged.connect(self.samplesListRowChanged)
 
         self.running = False
+        self._tabFns = {}
+        self._tabWidgets = []
 
     def newConfig(self):
         kwargs = {} if useNativeDialog else {'options': QFileDialog.DontUseNativeDialog}
@@ -61,24 +82,7 @@ class MainWindow(MainWindowBase, MainWindowUI):
             return
         try:
             with open(cfgfile, 'w') as fp:
-                config = self.configLoader.loadData({
-                    'instruments': {
-                        'vna0': {
-                            'type': 'vna',
-                            'model': 'simulated',
-                            'segments': {
-                                'TM010' : {
-                                    'type': 'Electric',
-                                    'f0': 2500700000.0,
-                                    'span': 1000000.0,
-                                    'points': 201,
-                                    'ifbw': 1000.0,
-                                    'power': 0.0
-                                }
-                            }
-                        }
-                    }
-                })
+                config = self.configLoader.loadData(NEW_CONFIG)
                 self.backend.set_config(config, os.path.dirname(cfgfile))
                 self.enableConfigWidgets()
                 self.updateConfigWidgets(self.backend.config)
@@ -169,15 +173,12 @@ class MainWindow(MainWindowBase, MainWindowUI):
             self.samplesList.item(i).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEditable | Qt.ItemIsEnabled)
 
     def timerTimeout(self):
-        updatefns = {}
-        for n in range(self.instrumentTabs.count()):
-            updatefns[self.instrumentTabs.tabText(n)] = self.instrumentTabs.widget(n).addSample
-        if not self.backend.process_samples(updatefns):
+        if not self.backend.process_samples(self._tabFns):
             self.recordButton.setChecked(False)
             self.incrementSample()
 
-        for n in range(self.instrumentTabs.count()):
-            self.instrumentTabs.widget(n).refresh()
+        for widget in self._tabWidgets:
+            widget.refresh()
 
     def runButtonClicked(self, running):
         if running:
@@ -187,6 +188,8 @@ class MainWindow(MainWindowBase, MainWindowUI):
                 instrument = self.backend.instruments[name]
                 widget = self.instrumentInfo[type(cfg)].dataWindow(instrument)
                 self.instrumentTabs.addTab(widget, name)
+                self._tabFns[name] = widget.addSample
+                self._tabWidgets.append(widget)
             self.updateTimer.start(500)
             self.updateSampleButtons(self.samplesList.currentRow())
             self.configureInstruments.setEnabled(False)
@@ -200,6 +203,8 @@ class MainWindow(MainWindowBase, MainWindowUI):
             self.recordButton.setChecked(False)
             self.recordButton.setEnabled(False)
             self.instrumentTabs.clear()
+            self._tabFns = {}
+            self._tabWidgets = []
             self.updateSampleButtons(self.samplesList.currentRow())
             self.configureInstruments.setEnabled(True)
             self.actionNewConfig.setEnabled(True)
@@ -313,7 +318,7 @@ class MainWindow(MainWindowBase, MainWindowUI):
 
     def closeEvent(self, event):
         if self.savePrompt():
-            self.backend.stop()
+            self.backend.close_instruments()
             self.updateTimer.stop()
         else:
             event.ignore()
@@ -34,7 +34,7 @@ class Driver(Instrument):
 
         def log(message):
             sampletime = datetime.now(timezone.utc)
-            self.queue.put((sampletime, message))
+            self.queue.append((sampletime, message))
 
         self._locals = {'pause': pause, 'record_wait': record_wait, 'log': log}
 
@@ -45,7 +45,7 @@ class Driver(Instrument):
         return locals_
 
     def _run(self):
-        self.setup()
+        self._open()
         
         while self.running:
             try:
@@ -54,7 +54,7 @@ class Driver(Instrument):
                 pass
         self.cleanup()
 
-    def setup(self):
+    def open(self):
         import visa
         from pyvisa.errors import VisaIOError
         import scpi
@@ -66,8 +66,9 @@ class Driver(Instrument):
         if not self.running:
             raise HaltException()
 
-    def cleanup(self):
+    def close(self):
         self.res.close()
+        self.res = None
 
     def get_headers(self):
         return ["message"]
@@ -89,6 +90,13 @@ class Driver(Instrument):
 
     def stop(self):
         """Stop the acquire loop"""
+        if self.thread is None:
+            return
         self.running = False
         self.runcmd(self.check_running)
-        self.thread.join()
\ No newline at end of file
+        self.thread.join()
+        self.thread = None
+
+    def reset(self):
+        super().reset()
+        self.recording = False
\ No newline at end of file
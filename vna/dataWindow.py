@@ -40,7 +40,7 @@ class DataWindow(
 
         self.fitGraph.addItem(self.fitPlot, 0, 0)
 
-        segmentCount = len(self.instrument.cfg.segments)
+        segmentCount = len(self.instrument.cfg.names)
         colours = ['r', 'g', 'b', 'c', 'm', 'y', 'w']
         self.frequencyPlotData = []
         self.qFactorPlotData = []
@@ -54,7 +54,7 @@ class DataWindow(
 
         self.segmentTable.setRowCount(segmentCount)
         self.segmentTable.setColumnCount(4)
-        self.segmentTable.setVerticalHeaderLabels([s.name for s in self.instrument.cfg.segments])
+        self.segmentTable.setVerticalHeaderLabels(self.instrument.cfg.names)
         self.segmentTable.setHorizontalHeaderLabels(["Enabled", "F0 (GHz)", "Q factor", "Insertion loss (dB)"])
         for row in range(segmentCount):
             checkbox = QTableWidgetItem()
@@ -66,7 +66,7 @@ class DataWindow(
             self.segmentTable.resizeColumnsToContents()
             self.segmentTable.resizeRowsToContents()
 
-        self.fitMode.addItems([s.name for s in self.instrument.cfg.segments])
+        self.fitMode.addItems(self.instrument.cfg.names)
         self.fitMode.setCurrentIndex(0)
 
         # Bind signals
@@ -135,17 +135,12 @@ class DataWindow(
             self.instrument.set_segment_enabled(row, checked)
 
     def addSample(self, elapsed, timestamp, sample):
+        # Missing segments are already nan
         for freq, frequencyBuffer in zip(sample.f0, self.frequencyBuffers):
-            if freq is not None:
-                frequencyBuffer.append(freq)
-            else:
-                frequencyBuffer.append(np.nan)
+            frequencyBuffer.append(freq)
 
         for qfac, qFactorBuffer in zip(sample.q, self.qFactorBuffers):
-            if qfac is not None:
-                qFactorBuffer.append(qfac)
-            else:
-                qFactorBuffer.append(np.nan)
+            qFactorBuffer.append(qfac)
 
         self.timeBuffer.append(elapsed)
 
@@ -184,13 +179,13 @@ class DataWindow(
 
         if self.lastSample:
             for row, f in enumerate(self.lastSample.f0):
-                if f is not None:
+                if not np.isnan(f):
                     self.segmentTable.item(row, 1).setText(float_to_si(f, 6) + "Hz")
             for row, q in enumerate(self.lastSample.q):
-                if q is not None:
+                if not np.isnan(q):
                     self.segmentTable.item(row, 2).setText(float_to_si(q, 6))
             for row, il in enumerate(self.lastSample.il):
-                if il is not None:
+                if not np.isnan(il):
                     self.segmentTable.item(row, 3).setText(float_to_si(il, 6) + "dB")
 
             index = self.fitMode.currentIndex()
@@ -2,12 +2,25 @@ from instrument import Instrument, runlater, InstrumentError
 import math
 import random
 import numpy as np
-from scipy.optimize import curve_fit
+from scipy.optimize import least_squares
 from scipy.stats import linregress
+import sys
 import time
 import copy
 from datetime import datetime, timezone, timedelta
-import itertools
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+else:
+    if getattr(sys, 'frozen', False):
+        # Frozen builds have no source files for numba to cache against
+        _njit = njit
+
+        def njit(*args, cache=False, **kwargs):
+            return _njit(*args, **kwargs)
 
 
 
@@ -21,36 +34,41 @@ class E5071X:
         from scpi import onoff
         rm = visa.ResourceManager()
         self.res = scpi.Wrapper(rm.open_resource(config.resource))
+        self._seg_key = None
 
     def supports_markers(self):
         return True
 
     def setup(self, use_markers):
         self.res.reset()
-        self.res.write(":CALC1:PAR1:DEF {}", "S21")
-        self.res.write(":INIT1:CONT {}", onoff(True))
-
+        # Chain the configuration into one message to save round trips
+        cmds = [":CALC1:PAR1:DEF S21",
+                ":INIT1:CONT {}".format(onoff(True))]
         if not use_markers:
-            self.res.write(":TRIG:SOUR BUS")
-        self.res.write(":SENS1:SWE:TYPE {}", "SEGM")
-        self.res.write(":SENS1:SWE:DELAY {}", 0.001)
-        self.res.write(":SENS1:SWE:GEN {}", "STEP")
+            cmds.append(":TRIG:SOUR BUS")
+            # Transfer sweeps as little endian doubles rather than ascii
+            cmds += [":FORM:DATA REAL", ":FORM:BORD SWAP"]
+        cmds += [":SENS1:SWE:TYPE SEGM",
+                 ":SENS1:SWE:DELAY {}".format(0.001),
+                 ":SENS1:SWE:GEN STEP"]
         if use_markers:
-            self.res.write(":CALC1:MARK:BWID {}", onoff(True))
-            self.res.write(":CALC1:MARK:FUNC:MULT:TYPE {}", "PEAK")
-            self.res.write(":CALC1:MARK:FUNC:EXEC")
-            self.res.write(":CALC1:MARK:FUNC:MULT:TRAC {}", onoff(True))
-
-    def set_segments(self, segments):
-        enacount = 0
-        # [<buf>,<stim>,<ifbw>,<pow>,<del>,<time>,<segm>]
-        data = [5, 1, 1, 1, 0, 0, None]
-        for s in segments:
-            if s.enabled:
-                enacount += 1
-                data += [s.f0, s.span, s.points, s.ifbw, s.power]
-        data[6] = enacount
-        self.res.write_ascii_values(":SENS1:SEGM:DATA", data)
+            cmds += [":CALC1:MARK:BWID {}".format(onoff(True)),
+                     ":CALC1:MARK:FUNC:MULT:TYPE PEAK",
+                     ":CALC1:MARK:FUNC:EXEC",
+                     ":CALC1:MARK:FUNC:MULT:TRAC {}".format(onoff(True))]
+        self.res.write(";".join(cmds))
+
+    def set_segments(self, table):
+        enabled = table[table['enabled']]
+        key = table['enabled'].tobytes()
+        if key != self._seg_key:
+            # Only f0 and span change when retracking so prebuild the rest
+            # [<buf>,<stim>,<ifbw>,<pow>,<del>,<time>,<segm>]
+            self._seg_fmt = ":SENS1:SEGM:DATA 5,1,1,1,0,0,{}".format(len(enabled))
+            self._seg_fmt += "".join(",{{!r}},{{!r}},{!r},{!r},{!r}".format(*row)
+                                     for row in enabled[['points', 'ifbw', 'power']].tolist())
+            self._seg_key = key
+        self.res.write(self._seg_fmt, *np.column_stack((enabled['f0'], enabled['span'])).ravel().tolist())
 
     def autoscale(self):
         self.res.write(":DISP:WIND1:TRAC1:Y:AUTO")
@@ -74,12 +92,23 @@ class E5071X:
         except VisaIOError:
             raise InstrumentError()
 
+    def get_all_marker_data(self, count, channel=1):
+        # Chain the queries so all markers are read in one round trip
+        cmd = ";".join(":CALC{}:MARK{}:BWID:DATA?".format(channel, m) for m in range(1, count+1))
+        try:
+            values = [float(v) for v in self.res.query(cmd).replace(';', ',').split(',')]
+            if len(values) != count*4:
+                raise ValueError("Expected {} marker values, got {}".format(count*4, len(values)))
+        except (VisaIOError, ValueError):
+            return [self.get_marker_data(m, channel) for m in range(1, count+1)]
+        return [values[i:i+4] for i in range(0, count*4, 4)]
+
     def get_sweep_data(self):
-        data = self.res.query_ascii_values(":CALC1:DATA:SDAT?")
-        return np.array(data).reshape((-1, 2)).T
+        data = self.res.query_binary_values(":CALC1:DATA:SDAT?", datatype='d', container=np.ndarray)
+        return data.reshape((-1, 2)).T
 
     def get_freq_data(self, channel=1):
-        return self.res.query_ascii_values(":SENS{}:FREQ:DATA?", channel)
+        return self.res.query_binary_values(":SENS{}:FREQ:DATA?", channel, datatype='d', container=np.ndarray)
 
     def cleanup(self):
         self.res.close()
@@ -87,12 +116,14 @@ class E5071X:
 
 class N5232A:
     def __init__(self, config):
+        global VisaIOError, onoff
         import visa
         from pyvisa.errors import VisaIOError
         import scpi
         from scpi import onoff
         rm = visa.ResourceManager()
         self.res = scpi.Wrapper(rm.open_resource(config.resource))
+        self._seg_key = None
 
     def supports_markers(self):
         return False
@@ -101,26 +132,29 @@ class N5232A:
         self.res.reset()
         if use_markers:
             raise ValueError("N5232A currently does not support markers")
-        self.res.write(":CALC1:PAR1:DEF {}", "S21")
-        self.res.write(":INIT1:CONT {}", onoff(True))
-        if not use_markers:
-            self.res.write(":TRIG:SOUR MAN")
-        self.res.write(":SENS1:SWE:TYPE {}", "SEGM")
-        self.res.write(":SENS1:SWE:DELAY {}", 0.001)
-        self.res.write(":SENS1:SWE:GEN {}", "STEP")
-
-    def set_segments(self, segments, channel=1):
-        enacount = 0
-        data = ["SSTOP", None]
-        for s in segments:
-            if s.enabled:
-                enacount += 1
-                data += [1, s.points, s.f0, s.span, s.ifbw, 0, s.power]
-        data[1] = enacount
-
-        self.res.write(":SENS{}:SEGM:BWID:CONT {}", channel, onoff(True))
-        self.res.write(":SENS{}:SEGM:POW:CONT {}", channel, onoff(True))
-        self.res.write_ascii_values(":SENS{}:SEGM:LIST", data, channel)
+        # Chain the configuration into one message to save round trips
+        cmds = [":CALC1:PAR1:DEF S21",
+                ":INIT1:CONT {}".format(onoff(True)),
+                ":TRIG:SOUR MAN",
+                # Transfer sweeps as little endian doubles rather than ascii
+                ":FORM:DATA REAL,64",
+                ":FORM:BORD SWAP",
+                ":SENS1:SWE:TYPE SEGM",
+                ":SENS1:SWE:DELAY {}".format(0.001),
+                ":SENS1:SWE:GEN STEP"]
+        self.res.write(";".join(cmds))
+
+    def set_segments(self, table, channel=1):
+        enabled = table[table['enabled']]
+        key = (channel, table['enabled'].tobytes())
+        if key != self._seg_key:
+            # Only f0 and span change when retracking so prebuild the rest
+            self._seg_fmt = ":SENS{0}:SEGM:BWID:CONT {1};:SENS{0}:SEGM:POW:CONT {1};".format(channel, onoff(True))
+            self._seg_fmt += ":SENS{}:SEGM:LIST SSTOP,{}".format(channel, len(enabled))
+            self._seg_fmt += "".join(",1,{!r},{{!r}},{{!r}},{!r},0,{!r}".format(*row)
+                                     for row in enabled[['points', 'ifbw', 'power']].tolist())
+            self._seg_key = key
+        self.res.write(self._seg_fmt, *np.column_stack((enabled['f0'], enabled['span'])).ravel().tolist())
 
     def autoscale(self):
         self.res.write(":DISP:WIND1:TRAC1:Y:AUTO")
@@ -141,12 +175,15 @@ class N5232A:
     def get_marker_data(self, marker=1, channel=1):
         raise NotImplementedError()
 
+    def get_all_marker_data(self, count, channel=1):
+        raise NotImplementedError()
+
     def get_sweep_data(self):
-        data = self.res.query_ascii_values(":CALC1:DATA? SDAT")
-        return np.array(data).reshape((-1, 2)).T
+        data = self.res.query_binary_values(":CALC1:DATA? SDAT", datatype='d', container=np.ndarray)
+        return data.reshape((-1, 2)).T
 
     def get_freq_data(self):
-        return self.res.query_ascii_values(":CALC1:X?")
+        return self.res.query_binary_values(":CALC1:X?", datatype='d', container=np.ndarray)
 
     def cleanup(self):
         self.res.close()
@@ -179,15 +216,12 @@ class S2VNA:
         self.app.scpi.display.GetWINDow(1).X.spacing = 'obase'
         # self.res.write(":SENS1:SWE:GEN {}", "STEP") # TODO find me if I exist
 
-    def set_segments(self, segments, channel=1):
-        enacount = 0
+    def set_segments(self, table, channel=1):
+        rows = table[table['enabled']][['f0', 'span', 'points', 'ifbw', 'power']].tolist()
         # [<buf>,<stim>,<ifbw>,<pow>,<del>,<time>,<segm>]
-        data = [5, 1, 1, 1, 0, 0, None]
-        for s in segments:
-            if s.enabled:
-                enacount += 1
-                data += [s.f0, s.span, s.points, s.ifbw, s.power]
-        data[6] = enacount
+        data = [5, 1, 1, 1, 0, 0, len(rows)]
+        for row in rows:
+            data += row
         self.app.scpi.GetSENSe(1).segment.data = data
 
     def autoscale(self):
@@ -199,6 +233,9 @@ class S2VNA:
     def get_marker_data(self, marker=1, channel=1):
         raise NotImplementedError()
 
+    def get_all_marker_data(self, count, channel=1):
+        raise NotImplementedError()
+
     def get_sweep_data(self):
         data = self.app.scpi.GetCALCulate(1).selected.data.sdata
         return np.array(data).reshape((-1, 2)).T
@@ -212,7 +249,7 @@ class S2VNA:
 
 class Simulated:
     def __init__(self, config):
-        self.segments = []
+        self.segments = np.zeros(0, dtype=SEGMENT_DTYPE)
         def make_sin(center, deviation, period):
             def fn(t):
                 return math.sin(t*2.0*math.pi/period)*deviation + center
@@ -226,8 +263,8 @@ class Simulated:
     def setup(self, use_markers):
         self.start_t = time.time()
 
-    def set_segments(self, segments, channel=1):
-        self.segments = [segment.copy() for segment in segments]
+    def set_segments(self, table, channel=1):
+        self.segments = table[table['enabled']]
 
     def autoscale(self):
         pass
@@ -238,36 +275,32 @@ class Simulated:
     def get_marker_data(self, marker=1, channel=1):
         raise NotImplementedError()
 
+    def get_all_marker_data(self, count, channel=1):
+        raise NotImplementedError()
+
     def get_sweep_data(self):
         frequencies = self.get_freq_data()
         amplitudes = np.zeros((2, len(frequencies)))
         delta_t = time.time() - self.start_t
 
         idx = 0
-        for segment in self.segments:
-            if segment.enabled:
-                freqs = frequencies[idx:idx+segment.points]
-                amplitudes[1][idx:idx+segment.points] = 0.0
-                for freq, bw in zip(self.frequencies, self.bandwidths):
-                    real = lorentz_fn(freqs, freq(delta_t), bw(delta_t), 0.05)
-                    amplitudes[0][idx:idx+segment.points] += real
-                idx += segment.points
+        for points in self.segments['points'].tolist():
+            freqs = frequencies[idx:idx+points]
+            amplitudes[1][idx:idx+points] = 0.0
+            for freq, bw in zip(self.frequencies, self.bandwidths):
+                real = lorentz_fn(freqs, freq(delta_t), bw(delta_t), 0.05)
+                amplitudes[0][idx:idx+points] += real
+            idx += points
         return amplitudes
 
     def get_freq_data(self):
-        enabled_pts = 0
-        for segment in self.segments:
-            if segment.enabled:
-                enabled_pts += segment.points
-
-        frequencies = np.zeros(enabled_pts)
+        frequencies = np.zeros(self.segments['points'].sum())
         idx = 0
-        for segment in self.segments:
-            if segment.enabled:
-                start = segment.f0-(segment.span/2.0)
-                stop = segment.f0+(segment.span/2.0)
-                frequencies[idx:idx+segment.points] = np.linspace(start, stop, segment.points)
-                idx += segment.points
+        for f0, span, points in self.segments[['f0', 'span', 'points']].tolist():
+            start = f0-(span/2.0)
+            stop = f0+(span/2.0)
+            frequencies[idx:idx+points] = np.linspace(start, stop, points)
+            idx += points
         return frequencies
 
     def cleanup(self):
@@ -279,8 +312,10 @@ class Driver(Instrument):
         self.forced_retrack = False
         self.config = config
         self.cfg = VNAState(config)
+        self._headers = None
+        self.driver = None
 
-    def setup(self):
+    def open(self):
         if self.config.model == 'N5232A':
             self.driver = N5232A(self.config)
         elif self.config.model == 'E5071X':
@@ -290,11 +325,12 @@ class Driver(Instrument):
         elif self.config.model == 'simulated':
             self.driver = Simulated(self.config)
 
+    def setup(self):
         if not self.driver.supports_markers():
             self.cfg.use_markers = False
 
         self.driver.setup(self.cfg.use_markers)
-        self.driver.set_segments(self.cfg.segments)
+        self.driver.set_segments(self.cfg.table)
         time.sleep(1.0)
         self.driver.autoscale()
         self.last_sample = None
@@ -302,75 +338,85 @@ class Driver(Instrument):
         self.next_call = datetime.now(timezone.utc)
 
     def sample(self):
-        self.driver.trigger(self.cfg.use_markers)
+        cfg = self.cfg
+        driver = self.driver
+        table = cfg.table
+        use_markers = bool(cfg.use_markers)
+        track_freq = bool(cfg.track_freq)
+        track_span = bool(cfg.track_span)
+        track_enabled = bool(cfg.track_enabled)
+        bw_factor = cfg.get_bw_factor()
+        tracking = (track_freq or track_span) and track_enabled
+
+        driver.trigger(use_markers)
         sampletime = datetime.now(timezone.utc)
 
-        data = Sample()
-        if self.cfg.use_markers:
+        n = len(table)
+        data = Sample(n)
+        set_segment = data.set_segment
+        if use_markers:
             try:
-                for i in range(len(self.cfg.segments)):
-                    bw, f0, q, il = self.driver.get_marker_data(i+1)
-                    data.add_segment(bw, f0, q, il)
+                markers = driver.get_all_marker_data(n)
+                for i, (bw, f0, q, il) in enumerate(markers):
+                    set_segment(i, bw, f0, q, il)
             except InstrumentError:
                 return None
 
             # Discard duplicate samples
-            if self.last_sample:
-                if self.last_sample == data:
-                    return None
-            self.last_sample = data
+            packed = np.stack((data.bw, data.f0, data.q, data.il))
+            if self.last_sample is not None and np.array_equal(self.last_sample, packed):
+                return None
+            self.last_sample = packed
         else:
-            cplx = self.driver.get_sweep_data()
-            ampl = np.sqrt(cplx[0]**2 + cplx[1]**2)
-            freq = self.driver.get_freq_data()
+            cplx = driver.get_sweep_data()
+            ampl = np.hypot(cplx[0], cplx[1])
+            freq = np.asarray(driver.get_freq_data())
 
             start = 0
             lost_track = False
-            for seg in self.cfg.segments:
-                if seg.enabled:
-                    f = freq[start:seg.points+start]
-                    a = ampl[start:seg.points+start]
-                    start += seg.points
+            for i, (enabled, points) in enumerate(zip(table['enabled'].tolist(),
+                                                      table['points'].tolist())):
+                if enabled:
+                    stop = start+points
+                    f = freq[start:stop]
+                    a = ampl[start:stop]
+                    start = stop
                     try:
-                        bw, f0, q, il, skew = lorentz_fit(f,a)
-                        data.add_segment(bw, f0, q, il, skew, freq=f, ampl=a)
+                        # Without tracking the peak can sit anywhere in the
+                        # window, so start from the closed form estimate
+                        bw, f0, q, il, skew = lorentz_fit(f, a, estimate=not tracking)
+                        set_segment(i, bw, f0, q, il, skew, freq=f, ampl=a)
                     except (RuntimeError, ValueError):
                         lost_track = True
-                        if self.cfg.track_freq and self.cfg.track_enabled:
+                        if track_freq and track_enabled:
                             slope, intercept, rvalue, pvalue, stderr = linregress(f, a)
                             if(slope > 0):
-                                seg.f0 += seg.span
+                                table['f0'][i] += table['span'][i]
                             else:
-                                seg.f0 -= seg.span
-                else: #segment not enabled
-                    data.add_segment(None, None, None, None)
+                                table['f0'][i] -= table['span'][i]
 
             if lost_track:
-                if self.cfg.track_freq and self.cfg.track_enabled:
-                    self.driver.set_segments(self.cfg.segments)
+                if track_freq and track_enabled:
+                    driver.set_segments(table)
                 return None
 
-        tracking_enabled = self.cfg.track_freq or self.cfg.track_span
-        if tracking_enabled and (self.cfg.track_enabled or self.forced_retrack):
-            retracked = False
-            for seg, f0, bw in zip(self.cfg.segments, data.f0, data.bw):
-                if not seg.enabled:
-                    continue
-                trackf, tracks = track_window(seg.f0, seg.span, f0, bw,
-                                              bw_factor=self.cfg.get_bw_factor())
-                if (trackf and self.cfg.track_freq) or (tracks and self.cfg.track_span) or self.forced_retrack:
-                    retracked = True
-                    if self.cfg.track_freq:
-                        seg.f0 = f0
-                    if self.cfg.track_span:
-                        seg.span = bw*self.cfg.get_bw_factor()
-            if retracked:
+        if (track_freq or track_span) and (track_enabled or self.forced_retrack):
+            trackf, tracks = track_window(table['f0'], table['span'], data.f0, data.bw,
+                                          bw_factor=bw_factor)
+            retrack = table['enabled'] & ((trackf & track_freq) |
+                                          (tracks & track_span) |
+                                          self.forced_retrack)
+            if retrack.any():
+                if track_freq:
+                    table['f0'][retrack] = data.f0[retrack]
+                if track_span:
+                    table['span'][retrack] = data.bw[retrack]*bw_factor
                 self.forced_retrack = False
-                self.driver.set_segments(self.cfg.segments)
-                self.driver.trigger(self.cfg.use_markers, force=True)
+                driver.set_segments(table)
+                driver.trigger(use_markers, force=True)
 
         # Sleep to use up remaining duration in sample_interval
-        self.next_call += timedelta(seconds=self.cfg.sample_interval)
+        self.next_call += timedelta(seconds=cfg.sample_interval)
         sleepytime = (self.next_call - datetime.now(timezone.utc)).total_seconds()
         if sleepytime > 0.0:
             time.sleep(sleepytime)
@@ -378,31 +424,46 @@ class Driver(Instrument):
         return sampletime, data
 
     def cleanup(self):
-        self.driver.cleanup()
+        if isinstance(self.driver, S2VNA):
+            # COM objects belong to the thread that created them, so
+            # reconnect on the next run
+            self.close()
+            self.opened = False
+
+    def close(self):
+        if self.driver is not None:
+            self.driver.cleanup()
+            self.driver = None
+
+    def reset(self):
+        super().reset()
+        self.forced_retrack = False
+        self.cfg = VNAState(self.config)
 
     def get_headers(self):
-        h = ["Frequency {}/Hz".format(s.name) for s in self.cfg.segments]
-        h += ["Q factor {}".format(s.name) for s in self.cfg.segments]
-        h += ["Insertion loss {}/dB".format(s.name) for s in self.cfg.segments]
-        return h
+        if self._headers is None:
+            names = self.cfg.names
+            h = ["Frequency {}/Hz".format(n) for n in names]
+            h += ["Q factor {}".format(n) for n in names]
+            h += ["Insertion loss {}/dB".format(n) for n in names]
+            self._headers = h
+        return self._headers
 
     def format_sample(self, data):
-        items = [data.f0, data.q, data.il]
+        result = np.concatenate((data.f0, data.q, data.il)).tolist()
         if self.cfg.verbose_logging:
             for item in data.freq:
                 if item is not None:
-                    items.append(item)
+                    result.extend(item)
             for item in data.ampl:
                 if item is not None:
-                    items.append(item)
-        
-        result = itertools.chain(*items)
+                    result.extend(item)
         return result
 
     @runlater
     def set_segment_enabled(self, segment, enabled):
-        self.cfg.segments[segment].enabled = enabled
-        self.driver.set_segments(self.cfg.segments)
+        self.cfg.table['enabled'][segment] = enabled
+        self.driver.set_segments(self.cfg.table)
 
     @runlater
     def set_bw_factor_override(self, factor):
@@ -414,10 +475,10 @@ class Driver(Instrument):
 
     @runlater
     def reset_segments(self):
-        for segment in self.cfg.segments:
-            segment.f0 = segment.f0_default
-            segment.span = segment.span_default
-        self.driver.set_segments(self.cfg.segments)
+        table = self.cfg.table
+        table['f0'] = table['f0_default']
+        table['span'] = table['span_default']
+        self.driver.set_segments(table)
 
     @runlater
     def force_retrack(self):
@@ -427,16 +488,21 @@ class Driver(Instrument):
     def set_verbose_logging(self, enabled):
         self.cfg.verbose_logging = enabled
 
+SEGMENT_DTYPE = np.dtype([('f0', 'f8'), ('span', 'f8'), ('points', 'i4'),
+                          ('ifbw', 'f8'), ('power', 'f8'), ('enabled', '?'),
+                          ('f0_default', 'f8'), ('span_default', 'f8')])
+
+
 class VNAState(object):
     def __init__(self, config):
-        self.segments = []
-        for n, s in config.segments.items():
-            self.segments.append(Segment(n, s.f0, s.span, s.points,
-                                         s.ifbw, s.power))
-        self.segments.sort(key=lambda seg: seg.f0)
-        self.track_freq = config.track_frequency
-        self.track_span = config.track_span
-        self.use_markers = config.use_markers
+        items = sorted(config.segments.items(), key=lambda item: item[1].f0)
+        # Segment settings live in one table so tracking can work on columns
+        self.names = [n for n, s in items]
+        self.table = np.array([(s.f0, s.span, s.points, s.ifbw, s.power, True, s.f0, s.span)
+                               for n, s in items], dtype=SEGMENT_DTYPE)
+        self.track_freq = bool(config.track_frequency)
+        self.track_span = bool(config.track_span)
+        self.use_markers = bool(config.use_markers)
         self.bw_factor = config.bandwidth_factor
         self.sample_interval = config.sample_interval
         self.bw_factor_override = None
@@ -450,90 +516,115 @@ class VNAState(object):
             return self.bw_factor
 
 
-class Segment(object):
-    def __init__(self, name, f0=2.495e9, span=50e6, points=51, ifbw=1000, power=0):
-        self.name = name
-        self.f0 = self.f0_default = f0
-        self.span = self.span_default = span
-        self.points = points
-        self.ifbw = ifbw
-        self.power = power
-        self.enabled = True
-
-    def copy(self):
-        copy = Segment(self.name, self.f0_default, self.span_default,
-                       self.points, self.ifbw, self.power)
-        copy.enabled = self.enabled
-        copy.f0 = self.f0
-        copy.span = self.span
-        return copy
-
-
 class Sample(object):
-    def __init__(self):
-        self.bw = []
-        self.f0 = []
-        self.q = []
-        self.il = []
-        self.skew = []
-        self.freq = []
-        self.ampl = []
-
-    def add_segment(self, bw, f0, q, il, skew=0.0, freq=None, ampl=None):
-        self.bw.append(bw)
-        self.f0.append(f0)
-        self.q.append(q)
-        self.il.append(il)
-        self.skew.append(skew)
-        self.freq.append(freq)
-        self.ampl.append(ampl)
-
-    def __eq__(self, other):
-        if self.bw != other.bw:
-            return False
-        if self.f0 != other.f0:
-            return False
-        if self.q != other.q:
-            return False
-        if self.il != other.il:
-            return False
-        if self.freq != other.freq:
-            return False
-        if self.ampl != other.ampl:
-            return False
-        return True
+    """Per segment results, segments without a result are left as nan"""
+    def __init__(self, n):
+        self.bw = np.full(n, np.nan)
+        self.f0 = np.full(n, np.nan)
+        self.q = np.full(n, np.nan)
+        self.il = np.full(n, np.nan)
+        self.skew = np.zeros(n)
+        self.freq = [None]*n
+        self.ampl = [None]*n
+
+    def set_segment(self, i, bw, f0, q, il, skew=0.0, freq=None, ampl=None):
+        self.bw[i] = bw
+        self.f0[i] = f0
+        self.q[i] = q
+        self.il[i] = il
+        self.skew[i] = skew
+        self.freq[i] = freq
+        self.ampl[i] = ampl
 
 
 def track_window(center, span, f0, bw, center_err=0.5,
                  span_err=0.3, bw_factor=8.0):
-    ferr = math.fabs(center-f0) + bw/2 #Ensure +- bw markers stay within
-                                       #center_err of window
+    """Check whether windows need retracking, works elementwise on arrays"""
+    ferr = np.abs(center-f0) + bw*0.5 #Ensure +- bw markers stay within
+                                      #center_err of window
     retrackf = ferr > span*center_err*0.5
 
-    retracks = (bw*bw_factor)/span > 1 + span_err
-    retracks = retracks or span/(bw*bw_factor) > 1 + span_err
+    span_ratio = (bw*bw_factor)/span
+    retracks = (span_ratio > 1 + span_err) | (1.0/span_ratio > 1 + span_err)
     return retrackf, retracks
 
 def lorentz_fn(x, f0, bw, pmax, skew=0.0):
     return (pmax + skew*(x-f0))/np.sqrt(1 + (4*((x-f0)/bw)**2))
 
-def lorentz_fit(freq, ampl, f0=0.5, bw=0.5, pmax=1.0, skew=0.0):
-
-    freq = np.array(freq)
-    ampl = np.array(ampl)
-    maxa = np.max(ampl)
-    norma = ampl/maxa
-    weights = norma*norma
-
-    minf = np.min(freq)
-    maxf = np.max(freq)
-    fspan = maxf-minf
-    normf = (freq-minf)/fspan
-    a1=0.0
-    (f0, bw, pmax, skew), pcov = curve_fit(lorentz_fn, normf, norma,
-                                     (f0, bw, pmax, skew))
+@njit(cache=True, fastmath=True)
+def _lorentz_resid(params, x, y):
+    f0, bw, pmax, skew = params
+    dx = x-f0
+    return y - (pmax + skew*dx)/np.sqrt(1 + (4*(dx/bw)**2))
+
+@njit(cache=True, fastmath=True)
+def _lorentz_jac(params, x, y):
+    f0, bw, pmax, skew = params
+    dx = x-f0
+    u = dx/bw
+    inv_d = 1.0/np.sqrt(1 + 4*u*u)
+    num = pmax + skew*dx
+    dinv = 4*u*inv_d*inv_d*inv_d/bw # d(1/D)/df0, and u times d(1/D)/dbw
+    jac = np.empty((x.shape[0], 4))
+    jac[:, 0] = skew*inv_d - num*dinv
+    jac[:, 1] = -num*u*dinv
+    jac[:, 2] = -inv_d
+    jac[:, 3] = -dx*inv_d
+    return jac
+
+# Compile now rather than on the first sweep
+_warm_params = np.array([0.5, 0.5, 1.0, 0.0])
+_warm_x = np.linspace(0.0, 1.0, 8)
+_lorentz_resid(_warm_params, _warm_x, _warm_x)
+_lorentz_jac(_warm_params, _warm_x, _warm_x)
+del _warm_params, _warm_x
+
+def lorentz_estimate(x, a, threshold=0.5):
+    """Closed form estimate of (f0, bw, pmax) for a normalised peak
+
+    1/a**2 of a lorentzian is a parabola in x, so a quadratic fit over the
+    points near the peak gives the parameters without iterating. Returns
+    None if the points do not describe a peak.
+    """
+    mask = a > a.max()*threshold
+    if np.count_nonzero(mask) < 3:
+        return None
+    c2, c1, c0 = np.polyfit(x[mask], 1.0/(a[mask]*a[mask]), 2)
+    if c2 <= 0.0:
+        return None
+    f0 = -c1/(2.0*c2)
+    v0 = c0 + c1*f0*0.5 # Value of the parabola at its minimum
+    if v0 <= 0.0:
+        return None
+    return f0, 2.0*np.sqrt(v0/c2), 1.0/np.sqrt(v0)
+
+def lorentz_fit(freq, ampl, f0=0.5, bw=0.5, pmax=1.0, skew=0.0, estimate=False):
+    """Fit a lorentzian to ndarrays of frequency and amplitude
+
+    If estimate is set the closed form estimate seeds the fit instead of
+    the default initial guess.
+    """
+    maxa = ampl.max()
+    inv_maxa = 1.0/maxa
+    norma = ampl*inv_maxa
+
+    minf = freq.min()
+    fspan = freq.max()-minf
+    inv_fspan = 1.0/fspan
+    normf = (freq-minf)*inv_fspan
+
+    if estimate:
+        seed = lorentz_estimate(normf, norma)
+        if seed is not None:
+            f0, bw, pmax = seed
+            skew = 0.0
+    result = least_squares(_lorentz_resid, np.array([f0, bw, pmax, skew]),
+                           jac=_lorentz_jac, args=(normf, norma), method='lm')
+    if not result.success:
+        raise RuntimeError(result.message)
+    f0, bw, pmax, skew = result.x
     f0 = (f0*fspan)+minf
     bw = np.fabs(bw)*fspan
-    skew = (skew/fspan)*maxa
+    skew = skew*inv_fspan*maxa
     pmax = 20*np.log10(pmax*maxa)
     return bw, f0, f0/bw, pmax, skew